@@ -0,0 +1,278 @@
+import sys
+import time
+import warnings
+import numpy as np
+
+# 0xBC Big Data V2 - Temperature sub type (Ref: Gadgetbridge BIG_DATA_TYPE_TEMPERATURE)
+BIG_DATA_CMD = 0xBC
+BIG_DATA_TEMPERATURE = 0x25
+
+# Payload Structure: [BC, TYPE, LEN_L, LEN_H, TS0, TS1, TS2, TS3, DATA...]
+# LEN (Little Endian) counts the bytes after the LEN field (TS + DATA).
+PREFIX_LEN = 4
+HEADER_LEN = 8
+
+# The ring logs temperature every 30 minutes
+SAMPLE_INTERVAL_S = 30 * 60
+
+# Physiological window (same as RingParser.parseBC) and the largest
+# believable change between two consecutive samples.
+TEMP_MIN = 30.0
+TEMP_MAX = 43.0
+TEMP_TYPICAL = 36.5
+MAX_STEP_C = 1.0
+
+# Candidate encodings of the DATA bytes: (name, sample width, byte order, scale, offset)
+# temperature = raw * scale + offset
+ENCODINGS = [
+    ("u8_tenths_plus20", 1, None, 0.1, 20.0),  # What the web parser shows today
+    ("u8_degrees", 1, None, 1.0, 0.0),         # INT8 candidates from 0x48
+    ("u16le_tenths", 2, "le", 0.1, 0.0),
+    ("u16be_tenths", 2, "be", 0.1, 0.0),
+    ("u16le_hundredths", 2, "le", 0.01, 0.0),
+]
+
+
+def payload_size(header):
+    """Total size of a 0xBC payload, from the LEN field of its first packet."""
+    return PREFIX_LEN + (header[2] | (header[3] << 8))
+
+
+class BigDataAssembler:
+    """
+    Reassembles 0xBC payloads the ring splits across several notifications.
+    feed() returns the complete payload once LEN bytes have arrived, else None.
+    A partial payload older than `timeout` seconds is dropped.
+    """
+
+    def __init__(self, timeout=3.0):
+        self.timeout = timeout
+        self._buf = bytearray()
+        self._expected = 0
+        self._last = 0.0
+
+    def feed(self, data):
+        now = time.monotonic()
+        if self._buf and now - self._last > self.timeout:
+            print(f"  Dropping stale 0xBC fragment ({len(self._buf)}/{self._expected} bytes)")
+            self._buf.clear()
+        self._last = now
+
+        if not self._buf:
+            if len(data) < PREFIX_LEN or data[0] != BIG_DATA_CMD:
+                return None  # Not the start of a payload
+            self._expected = payload_size(data)
+        self._buf += data
+
+        if len(self._buf) < self._expected:
+            return None
+        payload = bytes(self._buf[:self._expected])
+        self._buf.clear()
+        return payload
+
+
+def _to_matrix(payloads):
+    """
+    Packs payloads (bytes, lists or arrays, 0xBC header included) into a
+    zero padded uint8 matrix of their DATA sections.
+    Returns (data, lengths, timestamps).
+    """
+    payloads = [
+        np.frombuffer(p, dtype=np.uint8) if isinstance(p, (bytes, bytearray, memoryview))
+        else np.asarray(p, dtype=np.uint8).ravel()
+        for p in payloads
+    ]
+    for i, p in enumerate(payloads):
+        if p.size < HEADER_LEN or p[0] != BIG_DATA_CMD or p[1] != BIG_DATA_TEMPERATURE:
+            raise ValueError("Not a 0xBC temperature payload: " + " ".join(f"{b:02X}" for b in p[:HEADER_LEN]))
+        size = payload_size(p)
+        if size < HEADER_LEN or p.size < size:
+            raise ValueError(f"Truncated 0xBC payload: LEN says {size} bytes, got {p.size}")
+        payloads[i] = p[:size]  # Ignore trailing padding
+
+    lengths = np.array([p.size - HEADER_LEN for p in payloads], dtype=np.int64)
+    width = int(lengths.max()) if lengths.size else 0
+    width += width % 2  # Room for the 16-bit views
+    data = np.zeros((len(payloads), width), dtype=np.uint8)
+    headers = np.zeros((len(payloads), HEADER_LEN), dtype=np.uint8)
+    for row, p in enumerate(payloads):
+        headers[row] = p[:HEADER_LEN]
+        data[row, :lengths[row]] = p[HEADER_LEN:]
+
+    # Timestamps in 0xBC seem to be standard Unix Epoch (Little Endian)
+    timestamps = headers[:, 4:8].copy().view("<u4").ravel().astype(np.int64)
+    return data, lengths, timestamps
+
+
+def _decode_candidates(data, lengths):
+    """
+    Decodes the DATA matrix with every candidate encoding at once.
+    Returns a (n_encodings, n_payloads, n_samples) float array, NaN where
+    there is no sample (padding, 0x00/0xFF fillers) or it is implausible.
+    """
+    n_rows, width = data.shape
+    out = np.full((len(ENCODINGS), n_rows, width), np.nan)
+    col = np.arange(width)
+
+    for k, (name, size, order, scale, offset) in enumerate(ENCODINGS):
+        if size == 1:
+            raw = data.astype(np.float64)
+            present = (col[None, :] < lengths[:, None]) & (data != 0x00) & (data != 0xFF)
+        else:
+            lo, hi = data[:, 0::2].astype(np.uint16), data[:, 1::2].astype(np.uint16)
+            raw16 = (hi << 8) | lo if order == "le" else (lo << 8) | hi
+            raw = raw16.astype(np.float64)
+            present = ((2 * col[None, :width // 2] + 1) < lengths[:, None]) & (raw16 != 0x0000) & (raw16 != 0xFFFF)
+
+        temps = raw * scale + offset
+        plausible = present & (temps >= TEMP_MIN) & (temps <= TEMP_MAX)
+        out[k, :, :temps.shape[1]] = np.where(plausible, temps, np.nan)
+
+    return out
+
+
+def _score(candidates, lengths):
+    """
+    Scores every (encoding, payload) pair.
+    Higher is better: coverage of the payload by plausible samples, minus a
+    penalty for jumps between consecutive samples and for drifting away from
+    a typical body temperature.
+    """
+    valid = ~np.isnan(candidates)
+    count = valid.sum(axis=2)
+
+    # Coverage: fraction of the payload bytes explained by plausible samples
+    widths = np.array([size for _, size, _, _, _ in ENCODINGS], dtype=np.float64)
+    coverage = count * widths[:, None] / np.maximum(lengths, 1)[None, :]
+
+    # Continuity: mean normalised jump between neighbouring plausible samples
+    # (NaNs are skipped by carrying the last valid value forward)
+    idx = np.where(valid, np.arange(candidates.shape[2]), 0)
+    np.maximum.accumulate(idx, axis=2, out=idx)
+    filled = np.take_along_axis(candidates, idx, axis=2)
+    jumps = np.abs(np.diff(filled, axis=2))
+    jumps = np.where(valid[:, :, 1:] & ~np.isnan(jumps), np.minimum(jumps / MAX_STEP_C, 1.0), np.nan)
+    with warnings.catch_warnings():
+        # All-NaN rows are expected here (no plausible samples for that encoding)
+        warnings.simplefilter("ignore", RuntimeWarning)
+        continuity = np.nan_to_num(np.nanmean(jumps, axis=2), nan=0.0) if jumps.shape[2] else np.zeros(count.shape)
+        median = np.nanmedian(np.where(count[:, :, None] > 0, candidates, TEMP_TYPICAL), axis=2)
+    typicality = np.abs(median - TEMP_TYPICAL) / (TEMP_MAX - TEMP_MIN)
+
+    score = coverage - continuity - typicality
+    return np.where(count > 0, score, -np.inf)
+
+
+def _edges(candidates, start, sample_interval):
+    """First / last plausible sample (value and time) of every (encoding, payload)."""
+    valid = ~np.isnan(candidates)
+    n_samples = candidates.shape[2]
+    first = np.argmax(valid, axis=2)
+    last = n_samples - 1 - np.argmax(valid[:, :, ::-1], axis=2)
+    first_val = np.take_along_axis(candidates, first[:, :, None], axis=2)[:, :, 0]
+    last_val = np.take_along_axis(candidates, last[:, :, None], axis=2)[:, :, 0]
+    return first_val, start + first * sample_interval, last_val, start + last * sample_interval
+
+
+def _boundary_penalty(candidates, start, best, sample_interval, previous):
+    """
+    Continuity across payloads: how far each candidate's first sample jumps
+    from the last sample of the chronologically previous payload (as decoded
+    by `best`), normalised by MAX_STEP_C per elapsed slot.
+    `previous` = (timestamp, temperature) stands in before the first payload.
+    """
+    n_enc, n_rows, n_samples = candidates.shape
+    if n_samples == 0:
+        return np.zeros((n_enc, n_rows))
+    first_val, first_ts, last_val, last_ts = _edges(candidates, start, sample_interval)
+
+    prev_val = np.full(n_rows, np.nan)
+    prev_ts = np.zeros(n_rows, dtype=np.int64)
+    order = np.argsort(start, kind="stable")
+    prev_val[order[1:]] = last_val[best[order[:-1]], order[:-1]]
+    prev_ts[order[1:]] = last_ts[best[order[:-1]], order[:-1]]
+    if previous is not None and n_rows:
+        prev_ts[order[0]], prev_val[order[0]] = int(previous[0]), float(previous[1])
+
+    slots = np.maximum((first_ts - prev_ts[None, :]) / sample_interval, 1.0)
+    jump = np.abs(first_val - prev_val[None, :]) / (MAX_STEP_C * slots)
+    return np.nan_to_num(np.minimum(jump, 1.0), nan=0.0)
+
+
+def resolve_temperature_series(payloads, sample_interval=SAMPLE_INTERVAL_S, previous=None):
+    """
+    Batch decodes 0xBC temperature payloads.
+    Every candidate encoding is evaluated at once, scored within its payload,
+    then re-scored for continuity with the neighbouring payload; the best one
+    is picked per payload and all payloads are merged into a single series.
+    When decoding one payload at a time, pass the last known sample as
+    `previous` = (timestamp, temperature) to keep the cross-payload check.
+    Returns dict: { 'timestamps': int64[], 'temperatures': float[], 'encodings': [name per payload] }
+    """
+    if len(payloads) == 0:
+        return {"timestamps": np.empty(0, dtype=np.int64), "temperatures": np.empty(0), "encodings": []}
+
+    data, lengths, start = _to_matrix(payloads)
+    candidates = _decode_candidates(data, lengths)
+    scores = _score(candidates, lengths)
+
+    # Second pass: neighbours are decoded with their first-pass pick
+    best = np.argmax(scores, axis=0)
+    scores = scores - _boundary_penalty(candidates, start, best, sample_interval, previous)
+    best = np.argmax(scores, axis=0)
+    rows = np.arange(len(payloads))
+    chosen = candidates[best, rows]  # (n_payloads, n_samples)
+    decodable = np.isfinite(scores[best, rows])
+
+    offsets = np.arange(chosen.shape[1], dtype=np.int64) * sample_interval
+    times = start[:, None] + offsets[None, :]
+
+    keep = ~np.isnan(chosen) & decodable[:, None]
+    timestamps, temperatures = times[keep], chosen[keep]
+    order = np.argsort(timestamps, kind="stable")
+
+    # Overlapping syncs report the same slots again: keep the latest copy
+    timestamps, temperatures = timestamps[order], temperatures[order]
+    last = np.ones(timestamps.size, dtype=bool)
+    last[:-1] = timestamps[1:] != timestamps[:-1]
+
+    return {
+        "timestamps": timestamps[last],
+        "temperatures": np.round(temperatures[last], 2),
+        "encodings": [ENCODINGS[k][0] if ok else None for k, ok in zip(best, decodable)],
+    }
+
+
+def parse_hex_log(lines):
+    """
+    Reads payloads from packet log lines ("BC 25 01 00 ...") as shown by the
+    debugger. Fragments are reassembled, so the log must only hold 0xBC lines
+    in arrival order.
+    """
+    payloads = []
+    assembler = BigDataAssembler(timeout=float("inf"))
+    for line in lines:
+        try:
+            packet = bytes(int(b, 16) for b in line.strip().split())
+        except ValueError:
+            continue
+        payload = assembler.feed(packet) if packet else None
+        if payload and len(payload) >= HEADER_LEN and payload[1] == BIG_DATA_TEMPERATURE:
+            payloads.append(np.frombuffer(payload, dtype=np.uint8))
+    return payloads
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python bigdata_temp.py <packet_log.txt>")
+        sys.exit(1)
+
+    with open(sys.argv[1]) as f:
+        payloads = parse_hex_log(f)
+    print(f"Found {len(payloads)} temperature payloads.")
+
+    result = resolve_temperature_series(payloads)
+    for i, name in enumerate(result["encodings"]):
+        print(f"  Payload {i}: {name or 'undecodable'}")
+    for ts, temp in zip(result["timestamps"], result["temperatures"]):
+        print(f"  {int(ts)}  {temp:.1f} C")
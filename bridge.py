@@ -1,7 +1,18 @@
 import asyncio
 import json
+import os
+import time
+import numpy as np
+from datetime import datetime, timezone
 from bleak import BleakClient, BleakScanner
 import websockets
+from command_scheduler import (
+    CommandScheduler, CMD_BIG_DATA, CMD_GET_STEP_SOMEDAY, CMD_START_REAL_TIME,
+    PRIORITY_RAW, RT_HEART_RATE, RT_SPO2,
+)
+from daily_summary import DailySummaryStore, STEP_SLOTS, day_of
+from bigdata_temp import BIG_DATA_TEMPERATURE, BigDataAssembler, resolve_temperature_series
+from upload_sink import BatchingUploader, FirestoreSink, HttpSink
 
 # Your Ring's ID
 RING_MAC = "32:34:42:35:F1:00"
@@ -9,6 +20,12 @@ RING_MAC = "32:34:42:35:F1:00"
 # Common Health Service UUIDs (Heart Rate is often standard)
 HEART_RATE_UUID = "00002a37-0000-1000-8000-00805f9b34fb"
 
+# Nordic UART Service (NUS) + V2 (Big Data) characteristics, same as useBluetooth.ts
+UART_RX_CHAR_UUID = "6e400002-b5a3-f393-e0a9-e50e24dcca9e" # Write
+UART_TX_CHAR_UUID = "6e400003-b5a3-f393-e0a9-e50e24dcca9e" # Notify
+V2_CMD_CHAR_UUID = "de5bf72a-d711-4e47-af26-65e3012a5dc7" # Write (0xBC goes here)
+V2_NOTIFY_CHAR_UUID = "de5bf729-d711-4e47-af26-65e3012a5dc7" # Notify
+
 # Global state to hold latest data
 ring_state = {
     "connected": False,
@@ -16,11 +33,128 @@ ring_state = {
     "raw": {}
 }
 
+# All writes to the ring go through here (one command on the wire at a time)
+scheduler = CommandScheduler()
+
+# Per-day aggregates for the dashboard, updated on every decoded sample
+summaries = DailySummaryStore()
+
+def make_uploader():
+    """
+    Cloud upload is optional and off unless explicitly enabled:
+      ASHERA_UPLOAD_URL       -> POST batches to that URL (local stand-in)
+      ASHERA_FIRESTORE=1      -> Firestore project NEXT_PUBLIC_FIREBASE_PROJECT_ID,
+                                 needs FIREBASE_TOKEN or FIRESTORE_EMULATOR_HOST
+    """
+    if os.environ.get("ASHERA_UPLOAD_URL"):
+        return BatchingUploader(HttpSink(os.environ["ASHERA_UPLOAD_URL"]))
+    if os.environ.get("ASHERA_FIRESTORE") == "1":
+        project_id = os.environ.get("NEXT_PUBLIC_FIREBASE_PROJECT_ID")
+        token = os.environ.get("FIREBASE_TOKEN")
+        if not project_id or not (token or os.environ.get("FIRESTORE_EMULATOR_HOST")):
+            print("ASHERA_FIRESTORE=1 needs NEXT_PUBLIC_FIREBASE_PROJECT_ID and FIREBASE_TOKEN "
+                  "(or FIRESTORE_EMULATOR_HOST). Upload disabled.")
+            return None
+        return BatchingUploader(FirestoreSink(project_id, token=token))
+    return None
+
+uploader = None
+
+def upload(ts, doc, field):
+    """
+    Queues a decoded sample for the cloud store (same shape as saveRingData).
+    The document id comes from the sample itself (type, field, timestamp),
+    so re-syncing the same history overwrites instead of duplicating.
+    """
+    if uploader:
+        timestamp = datetime.fromtimestamp(ts, timezone.utc).isoformat().replace("+00:00", "Z")
+        uploader.add({"docId": f"{doc['type']}-{field}-{int(ts)}", "timestamp": timestamp, **doc})
+
+def _bcd(b):
+    """BCD byte -> int, None if either nibble is not a decimal digit."""
+    hi, lo = b >> 4, b & 0x0F
+    if hi > 9 or lo > 9:
+        return None
+    return hi * 10 + lo
+
+def _step_day(data):
+    """YYYY-MM-DD from a 0x43 packet's BCD date, None if it is not a valid date."""
+    year, month, day = _bcd(data[1]), _bcd(data[2]), _bcd(data[3])
+    if None in (year, month, day):
+        return None
+    try:
+        return datetime(2000 + year, month, day).strftime("%Y-%m-%d")
+    except ValueError:
+        return None
+
+# Last decoded temperature sample (timestamp, temperature), used as the
+# continuity reference for the next 0xBC payload
+last_temperature = None
+
+def record_sample(data):
+    """Decodes a notification and folds it into ring_state / the daily summaries."""
+    command = data[0]
+
+    if command == CMD_START_REAL_TIME and len(data) > 3:
+        rt_type, val = data[1], data[3]
+        now = time.time()
+        if val > 0 and rt_type == RT_HEART_RATE:
+            ring_state["heartRate"] = val
+            summaries.add_heart_rate(now, val)
+            upload(now, {"type": "health", "heartRate": val}, "heartRate")
+        elif val > 0 and rt_type == RT_SPO2:
+            ring_state["spo2"] = val
+            summaries.add_spo2(now, val)
+            upload(now, {"type": "health", "bloodOxygen": val}, "bloodOxygen")
+
+    elif command == CMD_GET_STEP_SOMEDAY and len(data) >= 12:
+        # [43, YY, MM, DD (BCD), TIME_INDEX (quarter hour), ..., STEPS_L, STEPS_H, ...]
+        # (Ref: colmi_r02_client/steps.py) - byte 1: 0xF0 = header packet, 0xFF = no data
+        if data[1] in (0xF0, 0xFF):
+            return
+        day = _step_day(data)
+        if day is None or data[4] >= STEP_SLOTS:
+            print(f"  Ignoring 0x43 packet with invalid date/slot: {data.hex(' ')}")
+            return
+        steps = data[9] | (data[10] << 8)
+        summaries.add_steps(day, data[4], steps)
+        slot_ts = datetime.strptime(day, "%Y-%m-%d").timestamp() + data[4] * 15 * 60
+        upload(slot_ts, {"type": "steps", "steps": steps}, "steps")
+
+    elif command == CMD_BIG_DATA and len(data) > 1 and data[1] == BIG_DATA_TEMPERATURE:
+        global last_temperature
+        series = resolve_temperature_series([np.frombuffer(data, dtype=np.uint8)], previous=last_temperature)
+        if len(series["temperatures"]):
+            last_temperature = (int(series["timestamps"][-1]), float(series["temperatures"][-1]))
+            ring_state["temperature"] = float(series["temperatures"][-1])
+            # Only samples the store has not seen yet (history syncs repeat old ones)
+            for ts, temp in summaries.add_temperatures(series["timestamps"], series["temperatures"]):
+                upload(ts, {"type": "temperature_history", "temperature": temp}, "temperature")
+
 async def notification_handler(sender, data):
     """Simple handler to capture data"""
     print(f"Received data from {sender}: {data}")
-    # Logic to parse whatever the ring sends would go here
-    # For R09 it might be custom byte arrays
+    # Completes the in-flight command if this is its response
+    scheduler.on_notification(data)
+    try:
+        record_sample(bytes(data))
+    except Exception as e:
+        print(f"  Failed to decode {bytes(data).hex(' ')}: {e}")
+
+# 0xBC replies can span several notifications on the V2 characteristic
+big_data = BigDataAssembler()
+
+async def v2_notification_handler(sender, data):
+    """V2 (Big Data) notifications: decoded once the whole payload (LEN bytes) is in"""
+    print(f"Received V2 data from {sender}: {data}")
+    payload = big_data.feed(bytes(data))
+    if payload is None:
+        return
+    scheduler.on_notification(payload)
+    try:
+        record_sample(payload)
+    except Exception as e:
+        print(f"  Failed to decode {payload.hex(' ')}: {e}")
 
 async def connect_to_ring():
     print(f"Searching for {RING_MAC}...")
@@ -39,26 +173,122 @@ async def connect_to_ring():
             for char in service.characteristics:
                  print(f"  [Char] {char} (Props: {char.properties})")
 
-        # Keep alive loop
-        while True:
-            await asyncio.sleep(1)
+        handlers = {UART_TX_CHAR_UUID: notification_handler, V2_NOTIFY_CHAR_UUID: v2_notification_handler}
+        for uuid, handler in handlers.items():
+            try:
+                await client.start_notify(uuid, handler)
+            except Exception as e:
+                print(f"Could not subscribe to {uuid}: {e}")
 
-async def ws_handler(websocket):
+        async def write_packet(packet):
+            # ROUTING LOGIC: DATA V2 (0xBC) goes to the V2 Command Char
+            uuid = V2_CMD_CHAR_UUID if packet[0] == CMD_BIG_DATA else UART_RX_CHAR_UUID
+            await client.write_gatt_char(uuid, packet)
+
+        scheduler.write = write_packet
+        try:
+            # Keep alive loop
+            while client.is_connected:
+                await asyncio.sleep(1)
+        finally:
+            scheduler.write = None
+            ring_state["connected"] = False
+
+async def handle_command(websocket, msg):
+    """
+    Queues a command from the Web App and replies with the ring's reply packets.
+    Message: { "id": 1, "command": "measureHeartRate" }
+          or { "id": 2, "command": "sendRaw", "cmd": 105, "args": [1, 1] }
+    """
+    reply = {"type": "commandResult", "id": msg.get("id"), "command": msg.get("command")}
+    try:
+        if msg.get("command") == "sendRaw":
+            # No retries: the reply (if any) may not echo the command byte
+            fut = scheduler.submit("sendRaw", int(msg["cmd"]), [int(b) for b in msg.get("args", [])], PRIORITY_RAW, retries=0)
+        else:
+            fut = scheduler.submit_named(msg.get("command"))
+        packets = await fut
+        reply.update(ok=True, response=[p.hex(" ").upper() for p in packets])
+    except Exception as e:
+        reply.update(ok=False, error=f"{type(e).__name__}: {e}")
+    try:
+        await websocket.send(json.dumps(reply))
+    except websockets.ConnectionClosed:
+        pass
+
+async def handle_summary_query(websocket, msg):
+    """
+    Message: { "id": 3, "command": "getDailySummaries", "from": "2026-10-01", "to": "2026-10-19" }
+    Missing dates default to today.
+    """
+    reply = {"type": "dailySummaries", "id": msg.get("id")}
+    try:
+        today = day_of(time.time())
+        start, end = msg.get("from") or today, msg.get("to") or today
+        if not isinstance(start, str) or not isinstance(end, str):
+            raise ValueError("'from' and 'to' must be YYYY-MM-DD strings")
+        reply.update(ok=True, days=summaries.query(start, end))
+    except Exception as e:
+        reply.update(ok=False, error=f"{type(e).__name__}: {e}")
+    try:
+        await websocket.send(json.dumps(reply))
+    except websockets.ConnectionClosed:
+        pass
+
+async def ws_status(websocket):
     """Sends ring status to the Web App"""
     while True:
-        await websocket.send(json.dumps(ring_state))
+        await websocket.send(json.dumps({**ring_state, "commands": scheduler.snapshot()}))
         await asyncio.sleep(1)
 
+async def ws_handler(websocket):
+    """Pushes status every second and accepts commands from the Web App"""
+    status_task = asyncio.create_task(ws_status(websocket))
+    pending = set()
+    try:
+        async for message in websocket:
+            try:
+                msg = json.loads(message)
+            except ValueError:
+                print(f"Ignoring non-JSON message: {message!r}")
+                continue
+            if not isinstance(msg, dict):
+                print(f"Ignoring message that is not a JSON object: {message!r}")
+                continue
+            if msg.get("command") == "getDailySummaries":
+                await handle_summary_query(websocket, msg)
+                continue
+            task = asyncio.create_task(handle_command(websocket, msg))
+            pending.add(task)
+            task.add_done_callback(pending.discard)
+    except websockets.ConnectionClosed:
+        pass
+    finally:
+        status_task.cancel()
+
 async def main():
+    global uploader
+    uploader = make_uploader()
+    tasks = [scheduler.run()]
+    if uploader:
+        print(f"Uploading readings via {type(uploader.sink).__name__}")
+        tasks.append(uploader.run())
+
     # Start Websocket Server
     print("Starting Websocket Bridge on ws://localhost:8765")
     start_server = websockets.serve(ws_handler, "localhost", 8765)
     
-    # Start Bluetooth Loop
-    await asyncio.gather(
-        start_server,
-        connect_to_ring()
-    )
+    # Start Bluetooth Loop + Command Scheduler (+ Upload Sink)
+    try:
+        await asyncio.gather(
+            start_server,
+            *tasks,
+            connect_to_ring()
+        )
+    finally:
+        if uploader:
+            # Anything still buffered goes to the spool for next time
+            await uploader.close()
 
 if __name__ == "__main__":
     try:
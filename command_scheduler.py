@@ -0,0 +1,288 @@
+import asyncio
+import heapq
+import itertools
+import time
+
+from bigdata_temp import payload_size
+
+# Command bytes (same as src/lib/bluetooth/useBluetooth.ts)
+CMD_BATTERY = 3
+CMD_GET_STEP_SOMEDAY = 67  # 0x43
+CMD_START_REAL_TIME = 105  # 0x69
+CMD_STOP_REAL_TIME = 106  # 0x6A
+CMD_BIG_DATA = 0xBC
+
+RT_HEART_RATE = 1
+RT_SPO2 = 3
+RT_FATIGUE = 4  # Stress?
+
+# Lower runs first. Real-time measures jump ahead of history sync.
+PRIORITY_REALTIME = 0
+PRIORITY_RAW = 1
+PRIORITY_SYNC = 2
+
+# --- Response matchers ---
+# A matcher looks at one notification and says whether it belongs to the
+# in-flight command's reply (PART) or is its last packet (DONE).
+PART = "part"
+DONE = "done"
+
+
+def match_command(command):
+    """Single packet echoing the command byte (default, used by sendRaw)."""
+    return lambda data: DONE if data[0] == command else None
+
+
+def match_realtime(rt_type):
+    """0x69 reading of this type (the ring keeps streaming other types too)."""
+    def match(data):
+        if data[0] == CMD_START_REAL_TIME and len(data) > 1 and data[1] == rt_type:
+            return DONE
+        return None
+    return match
+
+
+def match_steps(data):
+    """
+    0x43 series (Ref: colmi_r02_client/steps.py): byte 1 0xF0 = header,
+    0xFF = no data; otherwise bytes 5/6 = packet index / packet count.
+    """
+    if data[0] != CMD_GET_STEP_SOMEDAY or len(data) < 7:
+        return None
+    if data[1] == 0xFF:
+        return DONE
+    if data[1] == 0xF0:
+        return PART
+    return DONE if data[5] >= data[6] - 1 else PART
+
+
+def match_big_data(sub_type):
+    """Whole 0xBC payload of this sub type (the bridge feeds reassembled payloads)."""
+    def match(data):
+        if len(data) < 4 or data[0] != CMD_BIG_DATA or data[1] != sub_type:
+            return None
+        return DONE if len(data) >= payload_size(data) else None
+    return match
+
+
+# Named commands the web app can request:
+#   name -> (command, subData, priority, retries, response matcher)
+# Retries are opt-in: only commands whose reply the matcher recognises.
+COMMANDS = {
+    "measureHeartRate": (CMD_START_REAL_TIME, [RT_HEART_RATE, 1], PRIORITY_REALTIME, 2, match_realtime(RT_HEART_RATE)),
+    "measureSPO2": (CMD_START_REAL_TIME, [RT_SPO2, 1], PRIORITY_REALTIME, 2, match_realtime(RT_SPO2)),
+    "measureStress": (CMD_START_REAL_TIME, [RT_FATIGUE, 1], PRIORITY_REALTIME, 2, match_realtime(RT_FATIGUE)),
+    "syncSteps": (CMD_GET_STEP_SOMEDAY, [0, 0x0F, 0x00, 0x5F, 0x01], PRIORITY_SYNC, 2, match_steps),
+    "syncTemperature": (CMD_BIG_DATA, [0x25, 0x01, 0x00, 0x3E, 0x81, 0x02], PRIORITY_SYNC, 2, match_big_data(0x25)),
+}
+
+
+def construct_packet(command, sub_data=(), no_padding=False):
+    """
+    Builds a ring packet. Port of constructPacket() in useBluetooth.ts:
+    16 bytes [CMD, DATA..., CHECKSUM], or exactly CMD + DATA when no_padding (0xBC).
+    """
+    if no_padding:
+        return bytes([command, *sub_data])
+
+    packet = bytearray(16)
+    packet[0] = command
+    for i, b in enumerate(list(sub_data)[:14]):
+        packet[i + 1] = b
+    packet[15] = sum(packet[:15]) & 0xFF  # Checksum
+    return bytes(packet)
+
+
+class ScheduledCommand:
+    """One BLE write shared by every requester that asked for the same packet."""
+
+    def __init__(self, name, packet, priority, seq, timeout, retries, matcher):
+        self.name = name
+        self.packet = packet
+        self.matcher = matcher
+        self.responses = []  # Packets of the current attempt's reply
+        self.priority = priority
+        self.seq = seq
+        self.timeout = timeout
+        self.retries = retries
+        self.attempts = 0
+        self.backing_off = False
+        self.waiters = []
+        self.created = time.monotonic()
+        self.last_error = None
+
+    @property
+    def key(self):
+        return self.packet
+
+    def resolve(self, response):
+        for fut in self.waiters:
+            if not fut.done():
+                fut.set_result(response)
+
+    def fail(self, error):
+        for fut in self.waiters:
+            if not fut.done():
+                fut.set_exception(error)
+
+    def describe(self):
+        return {
+            "command": self.name,
+            "packet": self.packet.hex(" ").upper(),
+            "priority": self.priority,
+            "attempts": self.attempts,
+            "waiters": len(self.waiters),
+            "age": round(time.monotonic() - self.created, 2),
+            "lastError": self.last_error,
+        }
+
+
+class CommandScheduler:
+    """
+    Serializes writes to the ring's single UART channel.
+
+    - Commands are queued by priority (then arrival order).
+    - Identical pending packets are coalesced: one BLE write, result fanned out.
+    - Each write holds the channel until its matcher sees the last packet of
+      the ring's reply; the reply packets are the result. Failures are retried up to `retries` times
+      (0 unless the command opts in), waiting `retry_delay` seconds, doubled
+      on every attempt, before going back in line.
+
+    `write` is an async callable taking the packet bytes. It is set by the
+    bridge once the ring is connected.
+    """
+
+    def __init__(self, write=None, timeout=5.0, retries=0, retry_delay=1.0):
+        self.write = write
+        self.timeout = timeout
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self._heap = []
+        self._pending = {}  # packet -> ScheduledCommand (queued or in flight)
+        self._seq = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._in_flight = None
+        self._response = None
+        self.stats = {"submitted": 0, "coalesced": 0, "writes": 0, "retries": 0, "failed": 0}
+
+    def submit(self, name, command, sub_data=(), priority=PRIORITY_RAW, timeout=None, retries=None, matcher=None):
+        """Queues a command and returns a future with the ring's reply (list of packets)."""
+        packet = construct_packet(command, sub_data, no_padding=(command == CMD_BIG_DATA))
+        fut = asyncio.get_running_loop().create_future()
+        self.stats["submitted"] += 1
+
+        entry = self._pending.get(packet)
+        if entry is not None:
+            # Same packet already pending: piggyback on it
+            self.stats["coalesced"] += 1
+            entry.waiters.append(fut)
+            if priority < entry.priority and entry is not self._in_flight:
+                # Promote it, the old heap slot becomes stale
+                entry.priority = priority
+                if not entry.backing_off:
+                    heapq.heappush(self._heap, (entry.priority, entry.seq, entry))
+            return fut
+
+        entry = ScheduledCommand(
+            name, packet, priority, next(self._seq),
+            self.timeout if timeout is None else timeout,
+            self.retries if retries is None else retries,
+            matcher or match_command(command),
+        )
+        entry.waiters.append(fut)
+        self._pending[packet] = entry
+        heapq.heappush(self._heap, (entry.priority, entry.seq, entry))
+        self._wakeup.set()
+        return fut
+
+    def submit_named(self, name):
+        """Queues one of COMMANDS by its useBluetooth.ts name."""
+        if name not in COMMANDS:
+            raise KeyError(f"Unknown command: {name}")
+        command, sub_data, priority, retries, matcher = COMMANDS[name]
+        return self.submit(name, command, sub_data, priority, retries=retries, matcher=matcher)
+
+    def on_notification(self, data):
+        """
+        Feed every notification from the ring here (0xBC as whole payloads).
+        The in-flight command completes on the last packet of its reply.
+        """
+        entry = self._in_flight
+        if entry is None or self._response is None or self._response.done() or not data:
+            return
+        verdict = entry.matcher(data)
+        if verdict is None:
+            return
+        entry.responses.append(bytes(data))
+        if verdict == DONE:
+            self._response.set_result(list(entry.responses))
+
+    def snapshot(self):
+        """Queue state for the web app / debugging."""
+        queued = sorted(
+            (e for e in self._pending.values() if e is not self._in_flight),
+            key=lambda e: (e.priority, e.seq),
+        )
+        return {
+            "inFlight": self._in_flight.describe() if self._in_flight else None,
+            "queued": [e.describe() for e in queued],
+            "stats": dict(self.stats),
+        }
+
+    def _requeue(self, entry):
+        """Back in line after the retry delay, keeping its place among equals."""
+        entry.backing_off = False
+        if self._pending.get(entry.key) is entry:
+            heapq.heappush(self._heap, (entry.priority, entry.seq, entry))
+            self._wakeup.set()
+
+    def _pop(self):
+        while self._heap:
+            priority, seq, entry = heapq.heappop(self._heap)
+            # Skip stale slots (promoted or already finished)
+            if self._pending.get(entry.key) is entry and priority == entry.priority:
+                return entry
+        return None
+
+    async def _attempt(self, entry):
+        entry.attempts += 1
+        if self.write is None:
+            raise ConnectionError("Ring not connected")
+        self._response = asyncio.get_running_loop().create_future()
+        entry.responses = []
+        self.stats["writes"] += 1
+        await self.write(entry.packet)
+        return await asyncio.wait_for(self._response, entry.timeout)
+
+    async def run(self):
+        """Worker loop: one command on the wire at a time."""
+        while True:
+            entry = self._pop()
+            if entry is None:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            self._in_flight = entry
+            try:
+                response = await self._attempt(entry)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                entry.last_error = f"{type(e).__name__}: {e}" if str(e) else type(e).__name__
+                print(f"  Command {entry.name} attempt {entry.attempts} failed: {entry.last_error}")
+                if entry.attempts <= entry.retries:
+                    self.stats["retries"] += 1
+                    entry.backing_off = True
+                    delay = self.retry_delay * 2 ** (entry.attempts - 1)
+                    asyncio.get_running_loop().call_later(delay, self._requeue, entry)
+                else:
+                    self.stats["failed"] += 1
+                    del self._pending[entry.key]
+                    entry.fail(e)
+            else:
+                del self._pending[entry.key]
+                entry.resolve(response)
+            finally:
+                self._in_flight = None
+                self._response = None
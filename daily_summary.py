@@ -0,0 +1,182 @@
+import sqlite3
+import time
+from array import array
+from datetime import datetime
+
+DEFAULT_DB_PATH = "ashera_daily.db"
+
+# Steps arrive per quarter hour (0x43 time index 0..95)
+STEP_SLOTS = 96
+
+# Temperature arrives per half hour (see bigdata_temp.SAMPLE_INTERVAL_S)
+TEMP_SLOTS = 48
+
+# Heart rate histogram, 1 bpm bins. Resting HR = low percentile of the day.
+HR_MIN = 30
+HR_MAX = 220
+RESTING_HR_PERCENTILE = 0.10
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS daily_summary (
+    day TEXT PRIMARY KEY,          -- YYYY-MM-DD (local time)
+    steps_slots BLOB,              -- uint16[96], steps per quarter hour
+    hr_hist BLOB,                  -- uint16[HR_MAX - HR_MIN + 1]
+    hr_count INTEGER DEFAULT 0,
+    hr_sum INTEGER DEFAULT 0,
+    temp_count INTEGER DEFAULT 0,
+    temp_sum REAL DEFAULT 0,
+    temp_min REAL,
+    temp_max REAL,
+    temp_slots BLOB,               -- bitmap of the TEMP_SLOTS half hours already counted
+    spo2_count INTEGER DEFAULT 0,
+    spo2_sum INTEGER DEFAULT 0,
+    spo2_min INTEGER,
+    updated_at INTEGER
+)
+"""
+
+
+def day_of(ts):
+    """Local calendar day (YYYY-MM-DD) of a Unix timestamp."""
+    return datetime.fromtimestamp(ts).strftime("%Y-%m-%d")
+
+
+def _u16(blob, size):
+    values = array("H")
+    if blob:
+        values.frombytes(blob)
+    if len(values) < size:
+        values.extend([0] * (size - len(values)))
+    return values
+
+
+class DailySummaryStore:
+    """
+    Per-day aggregates, updated incrementally as samples are decoded.
+    Every add_* call folds one sample into its day's row, so reading any date
+    range is a single query over one row per day.
+    """
+
+    def __init__(self, path=DEFAULT_DB_PATH):
+        self.conn = sqlite3.connect(path)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute(SCHEMA)
+        columns = {row["name"] for row in self.conn.execute("PRAGMA table_info(daily_summary)")}
+        if "temp_slots" not in columns:
+            # Tables created before the slot bitmap
+            self.conn.execute("ALTER TABLE daily_summary ADD COLUMN temp_slots BLOB")
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+    def _row(self, day):
+        row = self.conn.execute("SELECT * FROM daily_summary WHERE day = ?", (day,)).fetchone()
+        if row is None:
+            self.conn.execute("INSERT INTO daily_summary (day, updated_at) VALUES (?, ?)", (day, int(time.time())))
+            row = self.conn.execute("SELECT * FROM daily_summary WHERE day = ?", (day,)).fetchone()
+        return row
+
+    def add_steps(self, day, slot, steps):
+        """0x43 step segment. Re-syncing a slot overwrites it instead of double counting."""
+        if not 0 <= slot < STEP_SLOTS:
+            return
+        with self.conn:
+            slots = _u16(self._row(day)["steps_slots"], STEP_SLOTS)
+            slots[slot] = min(int(steps), 0xFFFF)
+            self.conn.execute(
+                "UPDATE daily_summary SET steps_slots = ?, updated_at = ? WHERE day = ?",
+                (slots.tobytes(), int(time.time()), day),
+            )
+
+    def add_heart_rate(self, ts, bpm):
+        if not HR_MIN <= bpm <= HR_MAX:
+            return
+        day = day_of(ts)
+        with self.conn:
+            hist = _u16(self._row(day)["hr_hist"], HR_MAX - HR_MIN + 1)
+            bin_ = int(bpm) - HR_MIN
+            hist[bin_] = min(hist[bin_] + 1, 0xFFFF)
+            self.conn.execute(
+                "UPDATE daily_summary SET hr_hist = ?, hr_count = hr_count + 1, hr_sum = hr_sum + ?, updated_at = ? WHERE day = ?",
+                (hist.tobytes(), int(bpm), int(time.time()), day),
+            )
+
+    def add_spo2(self, ts, spo2):
+        if not 0 < spo2 <= 100:
+            return
+        with self.conn:
+            day = day_of(ts)
+            self._row(day)
+            self.conn.execute(
+                """UPDATE daily_summary SET spo2_count = spo2_count + 1, spo2_sum = spo2_sum + ?,
+                   spo2_min = MIN(COALESCE(spo2_min, ?), ?), updated_at = ? WHERE day = ?""",
+                (int(spo2), int(spo2), int(spo2), int(time.time()), day),
+            )
+
+    def add_temperatures(self, timestamps, temperatures):
+        """
+        Folds a decoded temperature series (see bigdata_temp.py) in one transaction.
+        History syncs repeat old samples, so each half-hour slot is counted
+        once, in whatever order the slots arrive.
+        Returns the (timestamp, temperature) samples that were new.
+        """
+        accepted = []
+        with self.conn:
+            for ts, temp in zip(timestamps, temperatures):
+                ts, temp = int(ts), float(temp)
+                day = day_of(ts)
+                when = datetime.fromtimestamp(ts)
+                slot = when.hour * 2 + when.minute // 30
+                slots = bytearray(self._row(day)["temp_slots"] or bytes((TEMP_SLOTS + 7) // 8))
+                if slots[slot // 8] & (1 << (slot % 8)):
+                    continue
+                slots[slot // 8] |= 1 << (slot % 8)
+                self.conn.execute(
+                    """UPDATE daily_summary SET temp_count = temp_count + 1, temp_sum = temp_sum + ?,
+                       temp_min = MIN(COALESCE(temp_min, ?), ?), temp_max = MAX(COALESCE(temp_max, ?), ?),
+                       temp_slots = ?, updated_at = ? WHERE day = ?""",
+                    (temp, temp, temp, temp, temp, bytes(slots), int(time.time()), day),
+                )
+                accepted.append((ts, temp))
+        return accepted
+
+    def query(self, start_day, end_day):
+        """
+        Summaries for start_day..end_day (inclusive, YYYY-MM-DD), oldest first.
+        Returns [{ date, steps, restingHeartRate, avgHeartRate, avgTemperature,
+                   minTemperature, maxTemperature, spo2, minSpo2 }]
+        """
+        rows = self.conn.execute(
+            "SELECT * FROM daily_summary WHERE day BETWEEN ? AND ? ORDER BY day",
+            (start_day, end_day),
+        ).fetchall()
+        return [self._summarize(row) for row in rows]
+
+    @staticmethod
+    def _summarize(row):
+        summary = {
+            "date": row["day"],
+            "steps": sum(_u16(row["steps_slots"], STEP_SLOTS)),
+            "restingHeartRate": None,
+            "avgHeartRate": None,
+            "avgTemperature": None,
+            "minTemperature": row["temp_min"],
+            "maxTemperature": row["temp_max"],
+            "spo2": None,
+            "minSpo2": row["spo2_min"],
+        }
+        if row["hr_count"]:
+            summary["avgHeartRate"] = round(row["hr_sum"] / row["hr_count"])
+            hist = _u16(row["hr_hist"], HR_MAX - HR_MIN + 1)
+            target, seen = sum(hist) * RESTING_HR_PERCENTILE, 0
+            for i, n in enumerate(hist):
+                seen += n
+                if n and seen >= target:
+                    summary["restingHeartRate"] = HR_MIN + i
+                    break
+        if row["temp_count"]:
+            summary["avgTemperature"] = round(row["temp_sum"] / row["temp_count"], 2)
+        if row["spo2_count"]:
+            summary["spo2"] = round(row["spo2_sum"] / row["spo2_count"])
+        return summary
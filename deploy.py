@@ -1,4 +1,6 @@
 import paramiko
+import errno
+import io
 import os
 import sys
 import stat
@@ -15,6 +17,79 @@ REMOTE_BASE = "domains/ashera.psyhackers.org/public_html"
 # Local Build Paths
 LOCAL_BUILD_DIR = "out"
 
+# --- Cache Policy ---
+# Next.js puts content-hashed chunks under _next/static: a new build means a new
+# filename, so they can be cached forever. HTML/JSON/TXT entry points keep their
+# names between builds and must stay short-lived.
+IMMUTABLE_PREFIXES = ("_next/static/",)
+ENTRY_EXTENSIONS = (".html", ".json", ".txt", ".xml")
+
+CACHE_IMMUTABLE = "public, max-age=31536000, immutable"
+CACHE_ENTRY = "public, max-age=60, must-revalidate"
+CACHE_ASSET = "public, max-age=86400"  # Unhashed files from public/ (icons, images)
+
+# Our rules live between these markers; anything else in a .htaccess
+# (redirects, rewrites maintained on the host) is left untouched.
+BLOCK_BEGIN = "# BEGIN Ashera cache policy (generated by deploy.py - edits inside are overwritten)"
+BLOCK_END = "# END Ashera cache policy"
+
+def generate_cache_config(local_dir):
+    """
+    Builds the cache rules for the export, one managed block per .htaccess.
+    Returns a dict: { 'relative/path/.htaccess': 'block text' }
+    A separate file inside each immutable prefix keeps the rule path based
+    without needing <If> support on the server.
+    """
+    entry_pattern = "|".join(ext.lstrip(".") for ext in ENTRY_EXTENSIONS)
+    configs = {
+        ".htaccess": [
+            "<IfModule mod_headers.c>",
+            f'    Header set Cache-Control "{CACHE_ASSET}"',
+            f'    <FilesMatch "\\.({entry_pattern})$">',
+            f'        Header set Cache-Control "{CACHE_ENTRY}"',
+            "    </FilesMatch>",
+            "</IfModule>",
+        ],
+    }
+    for prefix in IMMUTABLE_PREFIXES:
+        if os.path.isdir(os.path.join(local_dir, prefix)):
+            configs[f"{prefix}.htaccess"] = [
+                "# Content-hashed files never change",
+                "<IfModule mod_headers.c>",
+                f'    Header set Cache-Control "{CACHE_IMMUTABLE}"',
+                "    Header unset ETag",
+                "</IfModule>",
+                "FileETag None",
+            ]
+    return {path: "\n".join([BLOCK_BEGIN, *lines, BLOCK_END]) for path, lines in configs.items()}
+
+def merge_managed_block(existing, block):
+    """Replaces our marked block in an existing .htaccess (or prepends it), keeping everything else."""
+    lines = existing.splitlines()
+    if BLOCK_BEGIN in lines and BLOCK_END in lines[lines.index(BLOCK_BEGIN):]:
+        start = lines.index(BLOCK_BEGIN)
+        end = lines.index(BLOCK_END, start)
+        lines[start:end + 1] = block.splitlines()
+    else:
+        lines = block.splitlines() + ([""] + lines if lines else [])
+    return "\n".join(lines) + "\n"
+
+def read_remote_text(sftp, remote_path):
+    """Reads a remote text file: "" if it does not exist, None if it cannot be read."""
+    try:
+        with sftp.open(remote_path, "r") as f:
+            return f.read().decode("utf-8")
+    except FileNotFoundError:
+        return ""
+    except IOError as e:
+        if e.errno == errno.ENOENT:  # Older paramiko raises a plain IOError
+            return ""
+        print(f"  Could not read {remote_path}: {e}")
+        return None
+    except Exception as e:
+        print(f"  Could not read {remote_path}: {e}")
+        return None
+
 def calculate_local_md5(filepath):
     """Calculates MD5 hash of a local file."""
     hash_md5 = hashlib.md5()
@@ -124,6 +199,28 @@ def upload_dir_smart(sftp, transport, local_dir, remote_dir):
                 pass
                 # print(f"    Skipping {f} (Identical)")
 
+    # 2b. Cache config: merged into the .htaccess the site would otherwise
+    # get (the build's own copy, else the one already on the host), then
+    # checked against the same remote checksums
+    for rel_file_path, block in generate_cache_config(local_dir).items():
+        remote_file_abs = f"{remote_dir}/{rel_file_path}"
+        local_copy = os.path.join(local_dir, rel_file_path)
+        if os.path.exists(local_copy):
+            with open(local_copy, encoding="utf-8") as f:
+                existing = f.read()
+            # Replaced by the merged version below
+            files_to_upload = [item for item in files_to_upload if item[1] != remote_file_abs]
+        else:
+            # Asked directly: the checksum listing can miss files it cannot hash
+            existing = read_remote_text(sftp, remote_file_abs)
+            if existing is None:
+                print(f"  Leaving remote {rel_file_path} untouched (unreadable).")
+                continue
+
+        content = merge_managed_block(existing, block).encode("utf-8")
+        if remote_hashes.get(rel_file_path) != hashlib.md5(content).hexdigest():
+            files_to_upload.append((content, remote_file_abs, rel_file_path))
+
     # 3. Perform Uploads
     if not files_to_upload:
         print("  All files are up to date! Nothing to do.")
@@ -132,7 +229,10 @@ def upload_dir_smart(sftp, transport, local_dir, remote_dir):
         for local, remote, name in files_to_upload:
             print(f"    Up: {name}")
             try:
-                sftp.put(local, remote)
+                if isinstance(local, bytes):
+                    sftp.putfo(io.BytesIO(local), remote) # Generated in memory
+                else:
+                    sftp.put(local, remote)
                 time.sleep(0.01) # Tiny buffer
             except Exception as e:
                  print(f"  FAILED to upload {name}: {e}")
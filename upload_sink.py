@@ -0,0 +1,316 @@
+import asyncio
+import json
+import os
+import time
+import urllib.error
+import urllib.request
+import uuid
+from datetime import datetime, timezone
+
+# Firestore collection used by src/lib/firebase/ringData.ts
+COLLECTION = "ring_data"
+
+DEFAULT_SPOOL_PATH = "ashera_upload_spool.jsonl"
+
+# Batches the sink refused for good (bad request, rejected writes) end up here
+DEFAULT_DEADLETTER_PATH = "ashera_upload_deadletter.jsonl"
+
+# Firestore accepts up to 500 writes per batchWrite
+MAX_BATCH_SIZE = 500
+
+# HTTP statuses worth retrying; any other 4xx will fail the same way again
+RETRYABLE_STATUS = {408, 429}
+
+
+class RejectedWrite(IOError):
+    """The sink answered but refused (some of) the batch's writes."""
+
+
+def _retryable(error):
+    """True for transient failures (offline, timeouts, 5xx/408/429)."""
+    if isinstance(error, urllib.error.HTTPError):
+        return error.code >= 500 or error.code in RETRYABLE_STATUS
+    if isinstance(error, RejectedWrite):
+        return False
+    return True
+
+
+def _to_value(v):
+    """Python value -> Firestore REST typed value."""
+    if v is None:
+        return {"nullValue": None}
+    if isinstance(v, bool):
+        return {"booleanValue": v}
+    if isinstance(v, int):
+        return {"integerValue": str(v)}
+    if isinstance(v, float):
+        return {"doubleValue": v}
+    if isinstance(v, (list, tuple)):
+        return {"arrayValue": {"values": [_to_value(x) for x in v]}}
+    if isinstance(v, dict):
+        return {"mapValue": {"fields": {k: _to_value(x) for k, x in v.items()}}}
+    return {"stringValue": str(v)}
+
+
+def _post_json(url, body, headers, timeout):
+    req = urllib.request.Request(
+        url,
+        data=json.dumps(body).encode("utf-8"),
+        headers={"Content-Type": "application/json", **headers},
+        method="POST",
+    )
+    with urllib.request.urlopen(req, timeout=timeout) as resp:
+        raw = resp.read()
+    return json.loads(raw) if raw else {}
+
+
+class HttpSink:
+    """
+    Posts each batch as { "batchId": ..., "documents": [...] } to a URL.
+    Handy as a local stand-in for the cloud store.
+    """
+
+    def __init__(self, url, headers=None, timeout=10.0):
+        self.url = url
+        self.headers = headers or {}
+        self.timeout = timeout
+
+    async def write_batch(self, batch_id, docs):
+        body = {"batchId": batch_id, "documents": docs}
+        await asyncio.to_thread(_post_json, self.url, body, self.headers, self.timeout)
+
+
+class FirestoreSink:
+    """
+    Writes batches with the Firestore REST batchWrite endpoint.
+    A sample's "docId" (if any) is its document id, otherwise it is derived
+    from the batch id; either way replaying a batch overwrites instead of
+    duplicating.
+    Set FIRESTORE_EMULATOR_HOST (e.g. "localhost:8080") to target the emulator.
+    """
+
+    def __init__(self, project_id, collection=COLLECTION, token=None, emulator_host=None, timeout=10.0):
+        emulator_host = emulator_host or os.environ.get("FIRESTORE_EMULATOR_HOST")
+        base = f"http://{emulator_host}" if emulator_host else "https://firestore.googleapis.com"
+        self.database = f"projects/{project_id}/databases/(default)"
+        self.url = f"{base}/v1/{self.database}/documents:batchWrite"
+        self.collection = collection
+        # The emulator accepts any "owner" token
+        self.token = token or ("owner" if emulator_host else None)
+        self.timeout = timeout
+
+    async def write_batch(self, batch_id, docs):
+        writes = []
+        for i, doc in enumerate(docs):
+            doc_id = doc.get("docId") or f"{batch_id}-{i}"
+            writes.append({
+                "update": {
+                    "name": f"{self.database}/documents/{self.collection}/{doc_id}",
+                    "fields": {k: _to_value(v) for k, v in doc.items() if v is not None and k != "docId"},
+                },
+                "updateTransforms": [{"fieldPath": "createdAt", "setToServerValue": "REQUEST_TIME"}],
+            })
+        headers = {"Authorization": f"Bearer {self.token}"} if self.token else {}
+        result = await asyncio.to_thread(_post_json, self.url, {"writes": writes}, headers, self.timeout)
+
+        failed = [s for s in result.get("status", []) if s.get("code", 0) != 0]
+        if failed:
+            raise RejectedWrite(f"{len(failed)}/{len(writes)} writes rejected: {failed[0].get('message')}")
+
+
+class BatchingUploader:
+    """
+    Coalesces decoded samples into batched writes.
+
+    - A batch is cut when it reaches `max_batch` samples or its oldest sample
+      is `max_wait` seconds old.
+    - Every batch is appended to a local write-ahead spool before upload and
+      acknowledged after, so nothing is lost while offline or on restart.
+    - Unacknowledged batches are drained with at most `max_concurrency`
+      uploads in flight; transient failures back off and retry.
+    - Batches the sink refuses for good are moved to a dead-letter file
+      and acknowledged, so they don't block the spool forever.
+    """
+
+    def __init__(self, sink, spool_path=DEFAULT_SPOOL_PATH, max_batch=100, max_wait=30.0,
+                 max_concurrency=4, retry_delay=5.0, max_retry_delay=300.0,
+                 deadletter_path=DEFAULT_DEADLETTER_PATH):
+        self.sink = sink
+        self.spool_path = spool_path
+        self.deadletter_path = deadletter_path
+        self.max_batch = min(max_batch, MAX_BATCH_SIZE)
+        self.max_wait = max_wait
+        self.max_concurrency = max_concurrency
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+
+        self._buffer = []
+        self._buffer_started = None
+        self._unacked = {}  # batch_id -> docs, in spool order
+        self._in_flight = set()
+        self._tasks = set()  # Upload tasks, referenced until done
+        self._wakeup = asyncio.Event()
+        self._probe_delay = retry_delay
+        self._next_probe = 0.0
+        self.online = True
+        self.stats = {"samples": 0, "batches": 0, "uploaded": 0, "failures": 0, "deadLettered": 0}
+
+        self._load_spool()
+
+    # --- Spool (write-ahead file) ---
+    def _load_spool(self):
+        if not os.path.exists(self.spool_path):
+            return
+        with open(self.spool_path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue  # Torn write at the end of the file
+                if "ack" in entry:
+                    self._unacked.pop(entry["ack"], None)
+                else:
+                    self._unacked[entry["id"]] = entry["docs"]
+        if self._unacked:
+            print(f"  Upload spool: {len(self._unacked)} batches pending from last run.")
+        self._compact()
+
+    def _append(self, entry, path=None):
+        with open(path or self.spool_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry, separators=(",", ":")) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _compact(self):
+        """Rewrites the spool with only the pending batches (or removes it)."""
+        if not self._unacked:
+            if os.path.exists(self.spool_path):
+                os.remove(self.spool_path)
+            return
+        tmp = self.spool_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            for batch_id, docs in self._unacked.items():
+                f.write(json.dumps({"id": batch_id, "docs": docs}, separators=(",", ":")) + "\n")
+        os.replace(tmp, self.spool_path)
+
+    # --- Producer side ---
+    def add(self, sample):
+        """Queues one decoded sample (a HealthPacket-like dict)."""
+        doc = {
+            **sample,
+            "source": sample.get("source", "bridge"),
+            "syncedAt": datetime.now(timezone.utc).isoformat(),
+        }
+        if not self._buffer:
+            self._buffer_started = time.monotonic()
+            self._wakeup.set()  # Arms the time-based flush
+        self._buffer.append(doc)
+        self.stats["samples"] += 1
+        if len(self._buffer) >= self.max_batch:
+            self.flush()
+
+    def flush(self):
+        """Cuts the current buffer into a spooled batch."""
+        if not self._buffer:
+            return
+        batch_id = f"{int(time.time())}-{uuid.uuid4().hex[:8]}"
+        docs, self._buffer, self._buffer_started = self._buffer, [], None
+        self._append({"id": batch_id, "docs": docs})
+        self._unacked[batch_id] = docs
+        self.stats["batches"] += 1
+        self._wakeup.set()
+
+    # --- Consumer side ---
+    def _ack(self, batch_id):
+        self._append({"ack": batch_id})
+        self._unacked.pop(batch_id, None)
+
+    async def _upload(self, batch_id, docs, slots):
+        try:
+            await self.sink.write_batch(batch_id, docs)
+        except Exception as e:
+            self.stats["failures"] += 1
+            if not _retryable(e):
+                # Retrying won't help: park it and move on
+                print(f"  Upload of batch {batch_id} refused, dead-lettered: {e}")
+                self._append({"id": batch_id, "docs": docs, "error": f"{type(e).__name__}: {e}"}, self.deadletter_path)
+                self._ack(batch_id)
+                self.stats["deadLettered"] += 1
+                self.online = True  # The sink did answer
+                return
+            if self.online:
+                print(f"  Upload failed, spooling offline: {e}")
+                self._probe_delay = self.retry_delay
+                self._next_probe = time.monotonic() + self._probe_delay
+            self.online = False
+        else:
+            self._ack(batch_id)
+            self.stats["uploaded"] += len(docs)
+            if not self.online:
+                print("  Upload sink back online.")
+            self.online = True
+        finally:
+            self._in_flight.discard(batch_id)
+            slots.release()
+            self._wakeup.set()
+
+    async def run(self):
+        """Flushes on time and drains the spool. Run alongside the bridge."""
+        slots = asyncio.Semaphore(self.max_concurrency)
+        while True:
+            self._wakeup.clear()
+            now = time.monotonic()
+            if self._buffer and now - self._buffer_started >= self.max_wait:
+                self.flush()
+
+            # While offline, probe with a single batch per backoff step
+            # before opening the floodgates again
+            if self.online:
+                budget = self.max_concurrency
+            elif now >= self._next_probe:
+                budget = 1
+                self._probe_delay = min(self._probe_delay * 2, self.max_retry_delay)
+                self._next_probe = now + self._probe_delay
+            else:
+                budget = 0
+
+            for batch_id, docs in list(self._unacked.items()):
+                if budget == 0:
+                    break
+                if batch_id in self._in_flight:
+                    continue
+                await slots.acquire()
+                self._in_flight.add(batch_id)
+                task = asyncio.create_task(self._upload(batch_id, docs, slots))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+                budget -= 1
+
+            if not self._unacked and not self._in_flight:
+                self._compact()
+
+            # Sleep until the next thing is due: the time-based flush (online
+            # or not, so buffered samples reach the spool) or the next probe
+            deadlines = []
+            if self._buffer:
+                deadlines.append(self._buffer_started + self.max_wait)
+            if not self.online:
+                deadlines.append(self._next_probe)
+            timeout = max(0.0, min(deadlines) - time.monotonic()) if deadlines else None
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def close(self, timeout=5.0):
+        """
+        Spools whatever is buffered and gives in-flight uploads `timeout`
+        seconds to finish (call on shutdown). Cancelled uploads stay in the
+        spool and are retried on the next run.
+        """
+        self.flush()
+        if self._tasks:
+            done, pending = await asyncio.wait(set(self._tasks), timeout=timeout)
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)